@@ -1,14 +1,24 @@
 import asyncio
+import atexit
 import logging 
-from typing import Dict, Optional
-from uuid import uuid4
-import aiofiles
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, Optional, Set, Tuple
+import secrets
 from fastapi import UploadFile, HTTPException
-from pathlib import Path
 import os
+import stat
 import magic
 from fastapi.responses import FileResponse
 
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
 ALLOWED_FILE_TYPES = {
@@ -21,9 +31,405 @@ ALLOWED_FILE_TYPES = {
     "image/tiff": ".tif",
 }
 
+# Extension -> MIME type for downloads. Reversed so the first MIME type listed
+# for an extension wins (".jpg" -> "image/jpeg", not "image/pjpeg").
+_EXTENSION_TYPES = {ext: mime for mime, ext in reversed(ALLOWED_FILE_TYPES.items())}
+_ALLOWED_TYPES_REPR = ", ".join(ALLOWED_FILE_TYPES)
+
 MAX_FILE_SIZE_MB = 10
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
-CHUNK_SIZE = 64 * 1024 # 64KB
+CHUNK_SIZE = 1024 * 1024 # 1MB
+MAGIC_HEADER_SIZE = 2048 # Bytes given to libmagic for types without a known signature
+WRITE_QUEUE_DEPTH = 4 # Chunks buffered between the upload reader and disk writer
+TMP_POOL_SIZE = 4 # Preallocated temp files kept ready per destination folder
+TMP_RESERVE_BYTES = MAX_FILE_SIZE_BYTES # Space preallocated per pooled temp file
+
+STALE_TMP_AGE_SECONDS = 60 * 60 # Unlocked temp files older than this are swept
+
+_TMP_NAME_RE = re.compile(r"\.tmp_[0-9a-f]{32}\Z")
+
+_TMP_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+
+# Loading the libmagic database is expensive, so build the detector once.
+# It is only ever called from the event loop thread, so sharing it is safe.
+_MAGIC = magic.Magic(mime=True)
+
+# Magic numbers for the default allow-list. Checking these few prefixes is far
+# cheaper than running the full libmagic rule set on every upload.
+_SIGNATURES = (
+    (b"%PDF-", "application/pdf"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+
+
+def _sniff_mime(header: bytes) -> str:
+    """
+    Detect the MIME type of a file from its leading bytes.
+
+    Known signatures are matched directly; anything else falls back to libmagic
+    so custom allow-lists keep working.
+    """
+    for signature, mime in _SIGNATURES:
+        if header.startswith(signature):
+            return mime
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    # Signatures only need the first 12 bytes; libmagic needs more context
+    # (e.g. zip-based or XML formats)
+    return _MAGIC.from_buffer(header[:MAGIC_HEADER_SIZE])
+
+
+def _declared_size(file: UploadFile) -> Optional[int]:
+    """
+    Return the upload size if it is known before reading, else None.
+
+    Starlette records the size of parsed multipart parts; otherwise fall back
+    to a Content-Length header on the part itself.
+    """
+    size = getattr(file, "size", None)
+    if size is not None:
+        return size
+    headers = getattr(file, "headers", None)
+    content_length = headers.get("content-length") if headers else None
+    if content_length and content_length.isdigit():
+        return int(content_length)
+    return None
+
+
+# Upload closes still running; holding references keeps the tasks alive
+_PENDING_CLOSES: Set[asyncio.Task] = set()
+
+
+def _close_in_background(file: UploadFile) -> None:
+    """
+    Close the upload without making the request wait for it.
+
+    Closing a spooled upload that spilled to disk deletes its temp file, which
+    does not need to delay the response.
+    """
+    task = asyncio.ensure_future(file.close())
+    _PENDING_CLOSES.add(task)
+    task.add_done_callback(_PENDING_CLOSES.discard)
+
+
+def _reserve_space(fd: int, reserve_bytes: int) -> None:
+    """
+    Reserve disk space for the whole upload up front.
+
+    Reserving a single extent keeps each write from having to grow the file.
+    Platforms or filesystems without posix_fallocate simply skip the reservation.
+    """
+    try:
+        os.posix_fallocate(fd, 0, reserve_bytes)
+    except (AttributeError, OSError):
+        pass
+
+
+def _open_tmp_file(path: str, reserve_bytes: int) -> int:
+    """Create a temp file with space reserved for reserve_bytes."""
+    fd = os.open(path, _TMP_OPEN_FLAGS, 0o666)
+    if fcntl is not None:
+        # Held until the fd is closed; marks the file as in use for sweeps
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            pass
+    _reserve_space(fd, reserve_bytes)
+    return fd
+
+
+def _reset_tmp_file(fd: int, reserve_bytes: int) -> None:
+    """Empty a temp file that was not used so it can be handed out again."""
+    os.ftruncate(fd, 0)
+    os.lseek(fd, 0, os.SEEK_SET)
+    _reserve_space(fd, reserve_bytes)
+
+
+def _discard_tmp_file(path: str, fd: Optional[int] = None) -> None:
+    """Close and delete a temp file, logging instead of raising on failure."""
+    try:
+        if fd is not None:
+            os.close(fd)
+        os.unlink(path)
+        logger.debug("Cleaned up temporary file: %s", path)
+    except FileNotFoundError:
+        pass # Already gone, nothing to clean up
+    except Exception:
+        logger.warning("Failed to cleanup temp file: %s", path)
+
+
+def _fsync_dir(path: str) -> None:
+    """Flush a directory entry change (e.g. a rename) to disk where supported."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return # Windows cannot open directories for fsync
+    try:
+        dir_fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        logger.warning("Failed to fsync directory: %s", path)
+
+
+def _finalize_tmp_file(path: str, fd: int, size: int, final_path: str, dest_folder: str) -> None:
+    """
+    Durably move a finished temp file into place.
+
+    Trims the reservation, flushes and closes the file, renames it and then
+    flushes the directory, all in one worker thread call.
+    """
+    try:
+        try:
+            os.ftruncate(fd, size)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(path, final_path)
+    except BaseException:
+        _discard_tmp_file(path)
+        raise
+    _fsync_dir(dest_folder)
+
+
+def _sweep_stale_tmp_files(directory: str) -> None:
+    """
+    Delete pooled temp files that no process holds any more.
+
+    Owners flock() each pooled file for as long as it is open, which also works
+    when several hosts or containers share the folder. A file whose lock can be
+    taken has been abandoned. Files younger than STALE_TMP_AGE_SECONDS are left
+    alone, as their creator may not have locked them yet. Without flock (e.g.
+    Windows) nothing is swept.
+    """
+    if fcntl is None:
+        return
+    cutoff = time.time() - STALE_TMP_AGE_SECONDS
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if not _TMP_NAME_RE.match(name):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.stat(path).st_mtime > cutoff:
+                continue
+            fd = os.open(path, os.O_WRONLY)
+        except OSError:
+            continue
+        try:
+            # Fails while the owner still has the file open (or without lock support)
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.unlink(path)
+            logger.debug("Removed stale temporary file: %s", path)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+# Pool upkeep runs here rather than in event loop tasks, so files being created
+# or recycled are never orphaned when a loop shuts down
+_TMP_POOL_EXECUTOR = ThreadPoolExecutor(thread_name_prefix="tmp-pool")
+
+
+def _submit(fn, *args) -> Optional[Future]:
+    """Run fn on the pool executor, or inline once the interpreter is shutting down."""
+    try:
+        return _TMP_POOL_EXECUTOR.submit(fn, *args)
+    except RuntimeError:
+        fn(*args)
+        return None
+
+
+class TmpFilePool:
+    """
+    Bounded pool of preallocated temp files inside one destination folder.
+
+    Creating, preallocating and deleting a temp file are metadata operations
+    that stall under load. Temp files are created on demand and replacements
+    are prepared in the background, so later uploads usually find one ready.
+    Temp files live next to their final path so the rename stays atomic.
+    """
+
+    def __init__(self, directory: str, reserve_bytes: int = TMP_RESERVE_BYTES, size: int = TMP_POOL_SIZE):
+        self.directory = directory
+        self.reserve_bytes = reserve_bytes
+        self.size = size
+        self._files: Deque[Tuple[str, int]] = deque()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _create(self) -> Tuple[str, int]:
+        path = os.path.join(self.directory, f".tmp_{secrets.token_hex(16)}")
+        return path, _open_tmp_file(path, self.reserve_bytes)
+
+    async def acquire(self) -> Tuple[str, int]:
+        """Take a ready temp file, creating one on the spot if the pool is empty."""
+        with self._lock:
+            if self._files:
+                return self._files.popleft()
+        create = _TMP_POOL_EXECUTOR.submit(self._create)
+        try:
+            return await asyncio.shield(asyncio.wrap_future(create))
+        except asyncio.CancelledError:
+            # The worker thread still creates the file; keep it instead of leaking it
+            create.add_done_callback(self._adopt)
+            raise
+
+    def _adopt(self, create: Future) -> None:
+        if not create.cancelled() and create.exception() is None:
+            self._keep(*create.result())
+
+    def release(self, path: str, fd: int) -> None:
+        """Reset a temp file that was not renamed into place and return it, in the background."""
+        _submit(self._recycle, path, fd)
+
+    def _recycle(self, path: str, fd: int) -> None:
+        try:
+            _reset_tmp_file(fd, self.reserve_bytes)
+        except OSError:
+            _discard_tmp_file(path, fd)
+            return
+        self._keep(path, fd)
+
+    def _keep(self, path: str, fd: int) -> None:
+        with self._lock:
+            if not self._closed and len(self._files) < self.size:
+                self._files.append((path, fd))
+                return
+        _discard_tmp_file(path, fd)
+
+    def replenish(self) -> None:
+        """Prepare a replacement for a temp file that was used up, in the background."""
+        _submit(self._refill)
+
+    def _refill(self) -> None:
+        with self._lock:
+            if self._closed or len(self._files) >= self.size:
+                return
+        try:
+            path, fd = self._create()
+        except OSError:
+            logger.warning("Could not preallocate temp file in %s", self.directory)
+            return
+        self._keep(path, fd)
+
+    def sweep_stale(self) -> None:
+        """Delete temp files abandoned in the folder, in the background."""
+        _submit(_sweep_stale_tmp_files, self.directory)
+
+    def close(self) -> None:
+        """Delete every pooled temp file, and any handed back to the pool later."""
+        with self._lock:
+            self._closed = True
+            files = list(self._files)
+            self._files.clear()
+        for path, fd in files:
+            _discard_tmp_file(path, fd)
+
+
+# Destination folders already created by this process
+_KNOWN_DIRS: Set[str] = set()
+
+# Folders whose stale temp files this process has already swept
+_SWEPT_DIRS: Set[str] = set()
+
+_TMP_POOLS: Dict[str, TmpFilePool] = {}
+
+
+def _get_tmp_pool(directory: str) -> TmpFilePool:
+    """Return the temp file pool for a folder, creating an empty one on first use."""
+    pool = _TMP_POOLS.get(directory)
+    if pool is None:
+        pool = _TMP_POOLS[directory] = TmpFilePool(directory)
+        if directory not in _SWEPT_DIRS:
+            _SWEPT_DIRS.add(directory)
+            pool.sweep_stale()
+    return pool
+
+
+def _close_all_tmp_pools() -> None:
+    while _TMP_POOLS:
+        _, pool = _TMP_POOLS.popitem()
+        pool.close()
+
+
+# Safety net for apps that never call close_tmp_pools(). Executor threads are
+# joined before atexit handlers run, so no refill can race with this.
+atexit.register(_close_all_tmp_pools)
+
+
+async def close_tmp_pools() -> None:
+    """Delete all pooled temp files. Call this on application shutdown."""
+    await asyncio.to_thread(_close_all_tmp_pools)
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    """Write the whole buffer to fd, retrying on short writes."""
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+async def _stream_to_fd(file: UploadFile, fd: int, first_chunk: bytes, max_size_bytes: int) -> int:
+    """
+    Copy the upload into fd, overlapping network reads with disk writes.
+
+    A producer reads chunks and enforces the size limit while a consumer writes
+    them out through a bounded queue. Returns the number of bytes written.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=WRITE_QUEUE_DEPTH)
+
+    async def produce() -> int:
+        total_size = 0
+        chunk = first_chunk
+        while chunk:
+            total_size += len(chunk)
+            if total_size > max_size_bytes:
+                # Log size violation (WARNING)
+                logger.warning("File %s exceeded size limit. Size: %s bytes", file.filename, total_size)
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Max allowed is {max_size_bytes} bytes.",
+                )
+            await queue.put(chunk)
+            chunk = await file.read(CHUNK_SIZE)
+        await queue.put(None)
+        return total_size
+
+    async def consume() -> None:
+        while (chunk := await queue.get()) is not None:
+            await asyncio.to_thread(_write_all, fd, chunk)
+
+    producer = asyncio.ensure_future(produce())
+    consumer = asyncio.ensure_future(consume())
+    tasks = (producer, consumer)
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        # Stop reading on any early exit (no-op once the producer has finished)
+        producer.cancel()
+        if not consumer.done():
+            # Let an in-flight write finish: the caller closes fd once we return
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+        await asyncio.wait(tasks)
+        # Drop chunks a failed consumer left behind
+        while not queue.empty():
+            queue.get_nowait()
+    consumer.result()
+    return producer.result()
+
 
 async def save_uploaded_file(
     file: UploadFile,
@@ -37,9 +443,12 @@ async def save_uploaded_file(
     Securely save an uploaded file with strict validation and atomic writing.
 
     Performs the following security-critical checks and operations:
-    - Real MIME type detection using libmagic (ignores client Content-Type header)
-    - Enforces maximum file size during streaming (prevents DoS via large uploads)
-    - Writes to a temporary file then atomically renames to final path
+    - Real MIME type detection from file signatures, falling back to libmagic
+      (ignores client Content-Type header)
+    - Enforces maximum file size up front when known and during streaming
+      (prevents DoS via large uploads)
+    - Writes to a pooled, preallocated temporary file then atomically and
+      durably renames it to the final path
     - Generates cryptographically safe unique filenames when requested
     - Comprehensive logging at appropriate levels (INFO/WARNING/ERROR)
 
@@ -50,7 +459,7 @@ async def save_uploaded_file(
         max_size_bytes: Maximum allowed size in bytes (default: 10 MB)
         allowed_types: Dict mapping allowed MIME types → file extensions.
                        Uses module-level ALLOWED_FILE_TYPES if None.
-        ensure_unique: If True (default), appends a UUID to prevent collisions
+        ensure_unique: If True (default), appends a random token to prevent collisions
                        and overwrites. Set to False only if caller guarantees uniqueness.
 
     Returns:
@@ -63,8 +472,11 @@ async def save_uploaded_file(
             - 500: Server error (disk, permissions, unexpected I/O issues)
 
     Note:
-        The uploaded file is always closed, and temporary files are cleaned up
-        even if an exception occurs.
+        The uploaded file is always closed (in a background task), and
+        temporary files are recycled even if an exception occurs. Each folder
+        keeps up to TMP_POOL_SIZE temp files of TMP_RESERVE_BYTES per process;
+        call close_tmp_pools() on shutdown to delete them (they are otherwise
+        only removed at interpreter exit).
     """
 
     # Log the attempt (INFO)
@@ -75,11 +487,22 @@ async def save_uploaded_file(
     if allowed_types is None:
         allowed_types = ALLOWED_FILE_TYPES
 
+    # --- Step 0: Known size check ---
+    # Reject early when the size is already known, without reading the upload
+    declared_size = _declared_size(file)
+    if declared_size is not None and declared_size > max_size_bytes:
+        logger.warning("File %s exceeded size limit. Declared size: %s bytes", file.filename, declared_size)
+        _close_in_background(file)
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Max allowed is {max_size_bytes} bytes.",
+        )
+
     # --- Step 1: Real MIME validation ---
     try:
-        header = await file.read(2048)
-        mime = magic.Magic(mime=True).from_buffer(header)
-        await file.seek(0)
+        # The first chunk is sniffed here and written below, so no rewind is needed
+        chunk = await file.read(CHUNK_SIZE)
+        mime = _sniff_mime(chunk)
     except Exception:
         # Log unexpected read errors (ERROR)
         logger.exception("Failed to read file header for MIME detection: %s", file.filename)
@@ -87,54 +510,49 @@ async def save_uploaded_file(
 
     if mime not in allowed_types:
         # Log the rejection (WARNING) - Good for security auditing
-        logger.warning("Upload rejected. Detected MIME: '%s'. Allowed: %s", mime, allowed_types.keys())
-        await file.close()
+        allowed_repr = _ALLOWED_TYPES_REPR if allowed_types is ALLOWED_FILE_TYPES else ", ".join(allowed_types)
+        logger.warning("Upload rejected. Detected MIME: '%s'. Allowed: %s", mime, allowed_repr)
+        _close_in_background(file)
         raise HTTPException(status_code=400, detail="Invalid or unsupported file content")
 
     extension = allowed_types[mime]
     logger.debug("MIME detected: %s. Using extension: %s", mime, extension)
 
     # --- Step 2: Directory handling ---
-    dest_dir = Path(dest_folder)
-    try:
-        dest_dir.mkdir(parents=True, exist_ok=True)
-    except OSError:
-        logger.error("Could not create destination directory: %s", dest_dir)
-        raise HTTPException(status_code=500, detail="Server configuration error")
+    if dest_folder not in _KNOWN_DIRS:
+        try:
+            os.makedirs(dest_folder, exist_ok=True)
+        except OSError:
+            logger.error("Could not create destination directory: %s", dest_folder)
+            raise HTTPException(status_code=500, detail="Server configuration error")
+        _KNOWN_DIRS.add(dest_folder)
 
     # --- Step 3: Unique filenames ---
     if ensure_unique:
-        base_name = f"{filename_prefix}{uuid4().hex}{extension}"
+        base_name = f"{filename_prefix}{secrets.token_hex(16)}{extension}"
     else:
         base_name = f"{filename_prefix}{extension}"
 
-    final_path = dest_dir / base_name
-    tmp_path = dest_dir / f".tmp_{uuid4().hex}_{base_name}"
+    final_path = os.path.join(dest_folder, base_name)
+    pool = _get_tmp_pool(dest_folder)
+    tmp_file = None
 
     try:
-        total_size = 0
-        async with aiofiles.open(tmp_path, "wb") as out_f:
-            while True:
-                chunk = await file.read(CHUNK_SIZE)
-                if not chunk:
-                    break
-
-                total_size += len(chunk)
-                if total_size > max_size_bytes:
-                    # Log size violation (WARNING)
-                    logger.warning("File %s exceeded size limit. Size: %s bytes", file.filename, total_size)
-                    raise HTTPException(
-                        status_code=413,
-                        detail=f"File too large. Max allowed is {max_size_bytes} bytes.",
-                    )
-                await out_f.write(chunk)
+        tmp_file = await pool.acquire()
+        total_size = await _stream_to_fd(file, tmp_file[1], chunk, max_size_bytes)
 
         # --- Step 4: Atomic rename ---
-        await asyncio.to_thread(os.replace, tmp_path, final_path)
+        tmp_path, fd = tmp_file
+        tmp_file = None # _finalize_tmp_file owns the temp file from here on
+        try:
+            await asyncio.to_thread(_finalize_tmp_file, tmp_path, fd, total_size, final_path, dest_folder)
+        finally:
+            # The temp file is used up either way (renamed or discarded)
+            pool.replenish()
         
         # Log Success (INFO)
-        logger.info("Successfully saved file: %s -> %s", file.filename, final_path)
-        return str(final_path)
+        logger.info("Successfully saved file: %s -> %s (%s bytes)", file.filename, final_path, total_size)
+        return final_path
 
     except HTTPException:
         raise # Re-raise HTTP exceptions so FastAPI handles them
@@ -144,14 +562,22 @@ async def save_uploaded_file(
         raise HTTPException(status_code=500, detail="File upload failed")
     
     finally:
-        # Cleanup logic remains the same...
-        await file.close()
-        try:
-            if tmp_path.exists():
-                tmp_path.unlink()
-                logger.debug("Cleaned up temporary file: %s", tmp_path)
-        except Exception:
-            logger.warning("Failed to cleanup temp file: %s", tmp_path)
+        _close_in_background(file)
+        if tmp_file is not None:
+            # The upload never reached the rename: recycle its temp file
+            pool.release(*tmp_file)
+
+
+# Resolved form of each base directory served by file_response
+_BASE_DIR_CACHE: Dict[str, str] = {}
+
+
+def _resolve_base_dir(base_dir: str) -> str:
+    """Resolve base_dir once and reuse the result on later downloads."""
+    resolved = _BASE_DIR_CACHE.get(base_dir)
+    if resolved is None:
+        resolved = _BASE_DIR_CACHE[base_dir] = os.path.realpath(base_dir)
+    return resolved
 
 
 def file_response(file_path: str, base_dir: str) -> FileResponse:
@@ -159,7 +585,7 @@ def file_response(file_path: str, base_dir: str) -> FileResponse:
     Securely serve a previously uploaded file with path traversal protection.
 
     Validates that the requested path:
-    - Resolves to a real file inside the allowed base directory
+    - Resolves to a regular file inside the allowed base directory
     - Has an extension present in the global allow-list
     - Does not attempt directory traversal
 
@@ -181,23 +607,45 @@ def file_response(file_path: str, base_dir: str) -> FileResponse:
         Logs path traversal attempts at ERROR level for security monitoring.
     """
 
-    resolved_path = Path(file_path).resolve()
-    base_dir_resolved = Path(base_dir).resolve()
+    base_dir_resolved = _resolve_base_dir(base_dir)
+    resolved_path = os.path.normpath(file_path)
+
+    # A plain file directly inside the (already resolved) base needs no realpath
+    # walk, and its lstat doubles as the stat for FileResponse. Anything nested,
+    # relative, missing or symlinked takes the slow path.
+    stat_result = None
+    if os.path.dirname(resolved_path) == base_dir_resolved:
+        try:
+            stat_result = os.lstat(resolved_path)
+        except OSError:
+            pass
+        else:
+            if stat.S_ISLNK(stat_result.st_mode):
+                stat_result = None
+    if stat_result is None:
+        resolved_path = os.path.realpath(file_path)
 
     # Security: Path Traversal
-    if not resolved_path.is_relative_to(base_dir_resolved):
+    if resolved_path != base_dir_resolved and not resolved_path.startswith(os.path.join(base_dir_resolved, "")):
         # SECURITY ALERT (CRITICAL or ERROR)
         # This implies someone is trying to hack your server (e.g. asking for ../../../etc/passwd)
         logger.error("SECURITY: Path traversal attempt detected! Requested: %s, Base: %s", file_path, base_dir)
         raise HTTPException(status_code=404, detail="File not found")
     
-    if not resolved_path.exists():
+    if stat_result is None:
+        try:
+            stat_result = os.stat(resolved_path)
+        except OSError:
+            stat_result = None
+    if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
         logger.info("File requested but not found: %s", resolved_path)
         raise HTTPException(status_code=404, detail="File not found")
     
-    ext = resolved_path.suffix.lower()
-    if ext not in ALLOWED_FILE_TYPES.values():
+    ext = os.path.splitext(resolved_path)[1].lower()
+    media_type = _EXTENSION_TYPES.get(ext)
+    if media_type is None:
         logger.warning("File requested with blocked extension: %s", ext)
         raise HTTPException(status_code=400, detail="File type not allowed")
 
-    return FileResponse(str(resolved_path))
\ No newline at end of file
+    # Passing the stat and media type spares Starlette another stat and a mimetypes lookup
+    return FileResponse(resolved_path, stat_result=stat_result, media_type=media_type)
\ No newline at end of file
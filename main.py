@@ -1,12 +1,30 @@
-from fastapi import FastAPI, File, UploadFile
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, HTTPException, UploadFile
 from pathlib import Path
 import os
 from fastapi.responses import JSONResponse
+from starlette.formparsers import MultiPartParser
 
-from file import ALLOWED_FILE_TYPES, MAX_FILE_SIZE_BYTES, file_response, save_uploaded_file
+from file import ALLOWED_FILE_TYPES, MAX_FILE_SIZE_BYTES, close_tmp_pools, file_response, save_uploaded_file
 
 
-app = FastAPI()
+# Keep uploads up to the size limit in memory instead of spooling them to a
+# temp file first, so each accepted upload hits the disk only once. Worst-case
+# RAM use is MAX_FILE_SIZE_BYTES per concurrent upload. Older Starlette
+# releases call this setting max_file_size.
+for _spool_attr in ("spool_max_size", "max_file_size"):
+    if hasattr(MultiPartParser, _spool_attr):
+        setattr(MultiPartParser, _spool_attr, MAX_FILE_SIZE_BYTES)
+        break
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Remove the preallocated temp files kept ready for uploads
+    await close_tmp_pools()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Define the absolute path based on the script location
 BASE_DIR = Path(__file__).resolve().parent 
@@ -16,6 +34,40 @@ UPLOAD_DIR_STR: str = str(UPLOAD_DIR) # Use string version for function compatib
 # Ensure the directory exists immediately on startup
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Allowance for multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+MAX_UPLOAD_REQUEST_BYTES = MAX_FILE_SIZE_BYTES + MULTIPART_OVERHEAD_BYTES
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject uploads whose Content-Length is already too large, before the body is read.
+    Requests without the header are still limited while streaming.
+
+    Plain ASGI rather than @app.middleware("http"), so every other request
+    (e.g. downloads) passes straight through without extra overhead.
+    """
+
+    def __init__(self, app, max_body_bytes: int, path: str = "/upload"):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == self.path:
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_body_bytes:
+                        response = JSONResponse(
+                            content={"detail": f"File too large. Max allowed is {MAX_FILE_SIZE_BYTES} bytes."},
+                            status_code=413
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+app.add_middleware(UploadSizeLimitMiddleware, max_body_bytes=MAX_UPLOAD_REQUEST_BYTES)
+
 @app.post("/upload")
 async def upload_document(file: UploadFile = File(...)):
     """
@@ -49,6 +101,11 @@ def download_file(filename: str):
     """
     Endpoint to retrieve files securely.
     """
+    # Only bare names of uploaded files are valid; reject anything else
+    # (separators, hidden/temp files) before touching the filesystem
+    if filename.startswith(".") or "/" in filename or "\\" in filename:
+        raise HTTPException(status_code=404, detail="File not found")
+
     # Construct the full path
     # strictly joining paths to prevent traversal
     file_path = os.path.join(UPLOAD_DIR_STR, filename)
@@ -56,7 +113,43 @@ def download_file(filename: str):
     # Validate and return
     return file_response(file_path,UPLOAD_DIR_STR)
 
+def worker_count() -> int:
+    """
+    Number of worker processes to run.
+
+    WEB_CONCURRENCY wins if set. Otherwise use the CPUs this process may run on,
+    capped by a cgroup v2 CPU quota (container CPU limits), since os.cpu_count()
+    reports every core of the host.
+    """
+    override = os.environ.get("WEB_CONCURRENCY", "")
+    if override.isdigit() and int(override) > 0:
+        return int(override)
+
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
 if __name__ == "__main__":
     import uvicorn
-    # Run the app
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Run one worker per available CPU. "auto" picks uvloop and httptools when
+    # installed (uvicorn[standard]) and falls back to asyncio/h11 elsewhere,
+    # e.g. Windows. Caches and temp file pools in file.py are per worker process.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=worker_count(),
+        loop="auto",
+        http="auto",
+    )